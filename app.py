@@ -1,6 +1,31 @@
 import streamlit as st
 import os
-from qa_system import QASystem
+
+# Config-driven QASystem
+APP_CONFIG = {
+    "show_validation": True,   # Show validation warnings in Streamlit
+    "verbose": False,          # Avoid console spam
+    "model": "gpt-3.5-turbo",
+    "temperature": 0.1,
+    "retrieval_k": 3,
+    "data_year": "2019-20"
+}
+
+@st.cache_resource(show_spinner=False)
+def load_qa_system(pdf_path, config_items):
+    """Build one QA system per document and config, shared across reruns"""
+    # Imported here so the first page render doesn't wait on LangChain/FAISS
+    from qa_system import QASystem
+    
+    # A fresh instance per cache entry: setup_document binds it to this PDF's index
+    qa_system = QASystem(config=dict(config_items))
+    qa_system.setup_document(pdf_path)
+    return qa_system
+
+@st.cache_data(show_spinner=False)
+def find_pdf_files(documents_folder, folder_mtime):
+    """List the PDFs in the documents folder (folder_mtime makes new files invalidate the cache)"""
+    return [f for f in os.listdir(documents_folder) if f.endswith('.pdf')]
 
 def main():
     st.title("FPL(2019/20) Player Data Q&A System")
@@ -19,23 +44,13 @@ def main():
         if st.button("Load FPL Document", type="primary"):
             with st.spinner("Loading document and creating embeddings..."):
                 try:
-                    # Use config-driven QASystem
-                    qa_system = QASystem(config={
-                        "show_validation": True,   # Show validation warnings in Streamlit
-                        "verbose": False,          # Avoid console spam
-                        "model": "gpt-3.5-turbo",
-                        "temperature": 0.1,
-                        "retrieval_k": 3,
-                        "data_year": "2019-20"
-                    })
-                    
                     # Find PDF file
                     documents_folder = "documents"
-                    pdf_files = [f for f in os.listdir(documents_folder) if f.endswith('.pdf')]
+                    pdf_files = find_pdf_files(documents_folder, os.path.getmtime(documents_folder))
                     
                     if pdf_files:
                         pdf_path = os.path.join(documents_folder, pdf_files[0])
-                        qa_system.setup_document(pdf_path)
+                        qa_system = load_qa_system(pdf_path, tuple(sorted(APP_CONFIG.items())))
                         
                         st.session_state.qa_system = qa_system
                         st.session_state.document_loaded = True
@@ -56,21 +71,18 @@ def main():
         
         # Suggested questions
         st.subheader("Try these questions:")
-        suggestions = [
-            "Who is the most expensive midfielder?",
-            "List all Manchester United players with price.",
-            "Which goalkeeper scored the most points?",
-            "Who are the cheapest forwards?",
-            "Which Chelsea players cost more than 8.0?",
-            "Compare Salah and Rooney.",
-            "What Arsenal defenders are available?"
-        ]
+        suggestions = st.session_state.qa_system.suggested_questions
         
-        cols = st.columns(2)
-        for i, suggestion in enumerate(suggestions):
-            col = cols[i % 2]
-            if col.button(suggestion, key=f"suggestion_{i}"):
-                st.session_state.current_question = suggestion
+        # One pills widget instead of a button per suggestion
+        suggestion = st.pills(
+            "Suggested questions",
+            suggestions,
+            selection_mode="single",
+            key="suggestion",
+            label_visibility="collapsed"
+        )
+        if suggestion:
+            st.session_state.current_question = suggestion
         
         # Question input
         question = st.text_input(
@@ -86,24 +98,26 @@ def main():
                         qa_system = st.session_state.qa_system
 
                         # Capture validation warnings
+                        warnings = []
                         if qa_system.show_validation:
                             warnings = qa_system.validate_question(question)
                             if warnings:
-                                st.warning("⚠️ **Data Scope Warnings:**")
-                                for warning in warnings:
-                                    st.write(f"• {warning}")
-                                st.write(f" **Our data covers:** {qa_system.data_year} FPL season only")
+                                st.warning(
+                                    "⚠️ **Data Scope Warnings:**\n\n"
+                                    + "\n".join(f"- {warning}" for warning in warnings)
+                                    + f"\n\n**Our data covers:** {qa_system.data_year} FPL season only"
+                                )
                         
-                        # Ask question using the QA system (config handles validation now)
-                        answer = qa_system.ask_question(question)
-                
+                        # Stream the answer from the QA system, reusing the warnings above
                         st.subheader("Answer:")
-                        st.write(answer)
+                        st.write_stream(qa_system.stream_answer(question, warnings=warnings))
                         
-                        if qa_system.show_validation and warnings:
+                        if warnings:
                             st.info(f" **Reminder:** This answer is based on {qa_system.data_year} data only!")
                 
-                        st.caption(" Estimated cost: ~$0.01-0.02")
+                        # Templated out-of-scope answers make no API call
+                        if not qa_system.is_out_of_scope(question):
+                            st.caption(" Estimated cost: ~$0.01-0.02")
                 
                     except Exception as e:
                         st.error(f"Error generating answer: {str(e)}")
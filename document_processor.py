@@ -1,28 +1,152 @@
 import os
+import asyncio
+import hashlib
+import pickle
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
+from pdf_pages import extract_pages
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
 
 #load environment variables
 load_dotenv()
 
+# Bump when chunking or the on-disk index layout changes so old caches are rebuilt
+CACHE_VERSION = "chunk-index-v2"
+
+# Settings that change the stored chunks or index; query-time and ingestion-speed
+# settings are left out so tuning them doesn't re-embed the document
+INDEX_CONFIG_KEYS = (
+    "chunk_size", "chunk_overlap", "index_type",
+    "hnsw_m", "ef_construction", "pq_m", "pq_bits"
+)
+
+class ChunkIndex:
+    """FAISS index plus chunk texts and metadata in arrays aligned with its ids"""
+    def __init__(self, index, texts, metadatas):
+        self.index = index
+        self.texts = np.array(texts, dtype=object)
+        self.metadatas = np.empty(len(metadatas), dtype=object)
+        self.metadatas[:] = metadatas
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search_ids(self, vector, k):
+        """Return the ids of the k nearest chunks"""
+        query = np.array([vector], dtype="float32")
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(query)  # stored vectors are unit length (cosine similarity)
+        _, ids = self.index.search(query, k)
+        ids = ids[0]
+        return ids[ids >= 0]  # faiss pads with -1 when it finds fewer than k
+
+    def search(self, vector, k):
+        """Return the texts of the k nearest chunks"""
+        return self.texts[self.search_ids(vector, k)]
+
+    @staticmethod
+    def is_saved(folder):
+        """Check that both files of a saved index are present"""
+        return all(os.path.isfile(os.path.join(folder, name)) for name in ("index.faiss", "chunks.pkl"))
+
+    def save(self, folder):
+        """Write the index and chunk arrays to disk"""
+        # Write into a temp folder and move it into place, so an interrupted
+        # save never leaves a half-written cache behind
+        parent = os.path.dirname(os.path.abspath(folder))
+        os.makedirs(parent, exist_ok=True)
+        tmp_folder = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            faiss.write_index(self.index, os.path.join(tmp_folder, "index.faiss"))
+            with open(os.path.join(tmp_folder, "chunks.pkl"), "wb") as f:
+                pickle.dump((self.texts, self.metadatas), f)
+            shutil.rmtree(folder, ignore_errors=True)  # stale or unreadable copy
+            os.replace(tmp_folder, folder)
+        except BaseException:
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, folder):
+        """Load a saved index (faiss only memory-maps IVF inverted lists;
+        HNSW and scalar-quantized indexes are read fully into RAM)"""
+        index = faiss.read_index(os.path.join(folder, "index.faiss"), faiss.IO_FLAG_MMAP)
+        with open(os.path.join(folder, "chunks.pkl"), "rb") as f:
+            texts, metadatas = pickle.load(f)
+        return cls(index, texts, metadatas)
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, config=None):
+        # Default chunking and index settings
+        # Search speed depends more on the faiss build than on these settings:
+        # faiss-cpu >= 1.8 picks its AVX2/AVX-512 kernels at import time
+        # (check with faiss.supported_instruction_sets(), see test_setup.py)
+        default_config = {
+            "chunk_size": 500,          # tokens per chunk
+            "chunk_overlap": 50,        # tokens shared between neighbouring chunks
+            "index_type": "hnsw",       # "hnsw", "ivfpq" or "sq8"
+            "hnsw_m": 32,               # graph neighbours per node
+            "ef_construction": 200,     # build-time search depth
+            "ef_search": 64,            # query-time search depth (recall vs latency)
+            "pq_m": 48,                 # PQ sub-vectors (must divide the embedding size)
+            "pq_bits": 8,               # bits per PQ code
+            "nprobe": 8,                # IVF cells scanned per query
+            "embedding_batch_size": 500, # texts sent per embeddings request
+            "max_concurrent_batches": 5, # embeddings requests in flight at once
+            "max_workers": None,        # PDF extraction processes (None = CPU count)
+            "parallel_page_threshold": 50 # smaller PDFs are read in-process
+        }
+
+        # Keep only the settings this class knows about
+        self.config = {**default_config, **{
+            k: v for k, v in (config or {}).items() if k in default_config
+        }}
+
         self.embeddings = OpenAIEmbeddings(
             model="text-embedding-3-small",
+            chunk_size=self.config["embedding_batch_size"],
             openai_api_key=os.getenv("OPENAI_API_KEY")
         )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, #size of each chunk
-            chunk_overlap=200, #overlap between chunks
-            length_function=len
+        # Chunks are measured in embedding-model tokens (counted by tiktoken),
+        # but still split on paragraph/line boundaries so table rows stay whole
+        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name="cl100k_base",
+            chunk_size=self.config["chunk_size"], #tokens per chunk
+            chunk_overlap=self.config["chunk_overlap"] #overlap between chunks
         )
     def load_document(self, pdf_path):
-        """Load PDF document"""
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
+        """Load PDF document, extracting pages in parallel for long documents"""
+        reader = PdfReader(pdf_path)
+        n_pages = len(reader.pages)
+
+        # Process startup costs more than parsing a short PDF
+        if n_pages < self.config["parallel_page_threshold"]:
+            texts = [page.extract_text() for page in reader.pages]
+        else:
+            workers = max(1, min(self.config["max_workers"] or os.cpu_count() or 1, n_pages))
+
+            # One contiguous page range per worker, so each opens the file once
+            step = -(-n_pages // workers)
+            jobs = [(pdf_path, start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+
+            # Spawn rather than fork the (multithreaded) Streamlit server
+            with ProcessPoolExecutor(
+                max_workers=len(jobs), mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                texts = [text for batch in executor.map(extract_pages, jobs) for text in batch]
+
+        documents = [
+            Document(page_content=text, metadata={"source": pdf_path, "page": i, "total_pages": n_pages})
+            for i, text in enumerate(texts)
+        ]
         print(f"Loaded {len(documents)} pages")
         return documents
     
@@ -31,10 +155,113 @@ class DocumentProcessor:
         print(f"Created {len(chunks)} chunks")
         return chunks
     
+    def create_index(self, vectors):
+        """Build and train the FAISS index instead of the default brute-force FlatL2"""
+        vectors = np.asarray(vectors, dtype="float32")
+        n, dim = vectors.shape
+
+        # PQ trains 2**pq_bits centroids per sub-vector, so it needs at least that many vectors
+        if self.config["index_type"] == "ivfpq" and n >= 2 ** self.config["pq_bits"]:
+            # Voronoi cells + product quantization: compressed codes, fewer vectors scanned
+            nlist = min(64, n // 39 + 1)
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, self.config["pq_m"], self.config["pq_bits"])
+            index.train(vectors)
+        elif self.config["index_type"] == "sq8":
+            # 8-bit scalar quantization: 4x less memory traffic than float32, no PQ training floor
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        else:
+            if self.config["index_type"] == "ivfpq":
+                print(f"Only {n} chunks, too few to train PQ - using HNSW")
+            index = faiss.IndexHNSWFlat(dim, self.config["hnsw_m"])
+            index.hnsw.efConstruction = self.config["ef_construction"]
+
+        self.tune_index(index)
+        return index
+
+    def tune_index(self, index):
+        """Apply query-time settings from config"""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.config["ef_search"]
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.config["nprobe"]
+
+    async def embed_texts(self, texts):
+        """Embed texts in fixed-size batches, several requests in flight at once"""
+        batch_size = self.config["embedding_batch_size"]
+        semaphore = asyncio.Semaphore(self.config["max_concurrent_batches"])
+        vectors = [None] * len(texts)
+
+        async def embed_batch(start):
+            async with semaphore:
+                batch = texts[start:start + batch_size]
+                vectors[start:start + len(batch)] = await self.embeddings.aembed_documents(batch)
+
+        await asyncio.gather(*[embed_batch(start) for start in range(0, len(texts), batch_size)])
+        return vectors
+
     def create_embeddings(self, chunks):
-        vectorstore = FAISS.from_documents(chunks, self.embeddings)
+        # Embed every chunk up front in concurrent batched requests
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = asyncio.run(self.embed_texts(texts))
+
+        vectors = np.asarray(vectors, dtype="float32")
+        if self.config["index_type"] == "sq8":
+            faiss.normalize_L2(vectors)  # inner product on unit vectors = cosine similarity
+
+        index = self.create_index(vectors)
+        index.add(vectors)
+        chunk_index = ChunkIndex(index, texts, [chunk.metadata for chunk in chunks])
         print("Embeddings created successfully")
-        return vectorstore
+        return chunk_index
+
+    def fingerprint(self, pdf_path):
+        """Hash the PDF content and index settings into a cache key"""
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        settings = [(key, self.config[key]) for key in INDEX_CONFIG_KEYS]
+        digest.update(repr((CACHE_VERSION, settings)).encode())
+        return digest.hexdigest()[:16]
+
+    def save_index(self, chunk_index, folder):
+        """Write the chunk index to disk"""
+        chunk_index.save(folder)
+        print(f"Saved embeddings to {folder}")
+
+    def load_prefetch(self, folder):
+        """Load saved (question, k) -> chunk ids for the suggested questions ({} if none)"""
+        path = os.path.join(folder, "prefetch.pkl")
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable prefetch cache {path}: {e}")
+            return {}
+
+    def save_prefetch(self, prefetch, folder):
+        """Save (question, k) -> chunk ids next to the index they point into"""
+        tmp_path = os.path.join(folder, "prefetch.pkl.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(prefetch, f)
+        os.replace(tmp_path, os.path.join(folder, "prefetch.pkl"))
+
+    def load_index(self, folder):
+        """Load a saved chunk index and apply query-time settings (None if missing or unreadable)"""
+        if not ChunkIndex.is_saved(folder):
+            return None
+        try:
+            chunk_index = ChunkIndex.load(folder)
+        except Exception as e:
+            print(f"Ignoring unreadable cache {folder}: {e}")
+            return None
+        self.tune_index(chunk_index.index)
+        print(f"Loaded cached embeddings from {folder}")
+        return chunk_index
     
 #Test function
 def test_document_processing():
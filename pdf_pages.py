@@ -0,0 +1,12 @@
+"""PDF page extraction for worker processes.
+
+Only imports pypdf, so workers started by DocumentProcessor.load_document
+don't have to load LangChain, FAISS or numpy.
+"""
+from pypdf import PdfReader
+
+def extract_pages(job):
+    """Extract the text of a range of pages (runs in a worker process)"""
+    pdf_path, start, stop = job
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
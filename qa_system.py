@@ -1,13 +1,24 @@
 import os
 import re
+import functools
 from dotenv import load_dotenv
 from document_processor import DocumentProcessor
 from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
 load_dotenv()
 
+# Questions offered in the UI; their context is retrieved when the document loads
+SUGGESTED_QUESTIONS = [
+    "Who is the most expensive midfielder?",
+    "List all Manchester United players with price.",
+    "Which goalkeeper scored the most points?",
+    "Who are the cheapest forwards?",
+    "Which Chelsea players cost more than 8.0?",
+    "Compare Salah and Rooney.",
+    "What Arsenal defenders are available?"
+]
+
 class QASystem:
     def __init__(self, config=None):
         """Initialize the Q&A system with configuration dictionary"""
@@ -19,7 +30,13 @@ class QASystem:
             "llm_model": "gpt-3.5-turbo",
             "temperature": 0.1,
             "retrieval_k": 3,
-            "data_year": "2019-20"
+            "data_year": "2019-20",
+            "index_type": "hnsw",   # "ivfpq" or "sq8" trade a little recall for a smaller index
+            "ef_search": 64,
+            "nprobe": 8,
+            "max_concurrent_batches": 5,
+            "cache_dir": "cache",  # set to None to always re-embed
+            "suggested_questions": SUGGESTED_QUESTIONS
         }
         
         # Merge defaults with user-provided config
@@ -29,30 +46,66 @@ class QASystem:
         self.show_validation = self.config["show_validation"]
         self.verbose = self.config["verbose"]
         self.data_year = self.config["data_year"]
+        self.suggested_questions = list(self.config["suggested_questions"])
+
+        # Validation patterns, compiled once
+        self._year_re = re.compile(r'\b(20\d{2})\b')
+        self._recent_re = re.compile(
+            r'202[3-9]|2024[/-]202[5-9]|current|\bnow\b|\btoday\b|\blatest\b|\brecent\b|\bthis season\b',
+            re.IGNORECASE
+        )
+        self._word_re = re.compile(r'[a-z]+')
+        # Final calendar year of the data, e.g. "2019-20" or "2019/20" -> 2020, "2019" -> 2019
+        years = re.split(r'[-/]', self.data_year)
+        first_year, last_year = years[0], years[-1]
+        self._last_year = int(first_year[:-len(last_year)] + last_year)
+
+        # Players not in 2019-20 season (examples)
+        self._modern_players = frozenset(['haaland', 'nunez', 'antony', 'casemiro', 'tchouameni'])
+
+        # Repeated and suggested questions skip re-validation
+        self._check_scope_cached = functools.lru_cache(maxsize=256)(self._check_scope)
 
         # Core components
-        self.processor = DocumentProcessor()
+        self.processor = DocumentProcessor(config=self.config)
         self.llm = ChatOpenAI(
             model=self.config["llm_model"],
             temperature=self.config["temperature"],
             openai_api_key=os.getenv("OPENAI_API_KEY")
         )
-        self.vectorstore = None
-        self.qa_chain = None
+        self.chunk_index = None
+        self.prompt = None
+        self._prefetch = {}
+        self._last_k = 0  # chunks used for the last answer
+
+        # Question -> embedding, so repeated questions skip the embeddings call
+        self._embed_query_cached = functools.lru_cache(maxsize=512)(
+            self.processor.embeddings.embed_query
+        )
     
     def setup_document(self, pdf_path):
         """Load and process document, create vector store"""
         if self.verbose:
             print("Setting up document processing...")
         
-        # Load and chunk document
-        documents = self.processor.load_document(pdf_path)
-        chunks = self.processor.split_documents(documents)
+        # Reuse embeddings saved for this exact document and settings
+        cache_path = None
+        if self.config["cache_dir"]:
+            cache_path = os.path.join(self.config["cache_dir"], self.processor.fingerprint(pdf_path))
         
-        # Create embeddings
-        if self.verbose:
-            print(" Creating embeddings (this will use OpenAI credits)...")
-        self.vectorstore = self.processor.create_embeddings(chunks)
+        self.chunk_index = self.processor.load_index(cache_path) if cache_path else None
+        if self.chunk_index is None:
+            # Load and chunk document
+            documents = self.processor.load_document(pdf_path)
+            chunks = self.processor.split_documents(documents)
+            
+            # Create embeddings
+            if self.verbose:
+                print(" Creating embeddings (this will use OpenAI credits)...")
+            self.chunk_index = self.processor.create_embeddings(chunks)
+            
+            if cache_path:
+                self.processor.save_index(self.chunk_index, cache_path)
         
         # Custom prompt
         prompt_template = f"""You are a Fantasy Premier League (FPL) expert assistant. 
@@ -76,79 +129,142 @@ Answer:"""
             input_variables=["context", "question"]
         )
         
-        # Create QA chain
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(
-                search_kwargs={"k": self.config["retrieval_k"]}
-            ),
-            chain_type_kwargs={"prompt": PROMPT},
-            return_source_documents=True
-        )
+        # Retrieval and generation are called directly, without a chain wrapper
+        self.prompt = PROMPT
+        
+        self._prefetch_suggestions(cache_path)
         
         if self.verbose:
             print("✅ Q&A system ready!")
     
-    def validate_question(self, question):
-        """Check if question might be outside our data scope"""
+    def _prefetch_suggestions(self, cache_path):
+        """Retrieve context for the suggested questions, reusing ids saved with the index"""
+        k = self.config["retrieval_k"]
+        keys = [question.strip().lower() for question in self.suggested_questions]
+        saved = self.processor.load_prefetch(cache_path) if cache_path else {}
+        
+        # One batched embeddings call for the suggestions not saved yet
+        missing = [(key, question) for key, question in zip(keys, self.suggested_questions)
+                   if (key, k) not in saved]
+        if missing:
+            vectors = self.processor.embeddings.embed_documents([question for _, question in missing])
+            for (key, _), vector in zip(missing, vectors):
+                saved[(key, k)] = self.chunk_index.search_ids(vector, k)
+            if cache_path:
+                self.processor.save_prefetch(saved, cache_path)
+        
+        self._prefetch = {key: self.chunk_index.texts[saved[(key, k)]] for key in keys}
+    
+    def _check_scope(self, question):
+        """Return (warnings, out_of_scope) for a question; out_of_scope means we can't have the data"""
         warnings = []
+        out_of_scope = False
         
         # Look for years beyond dataset
-        years = re.findall(r'\b(20\d{2})\b', question)
-        for year in years:
-            if int(year) > int(self.data_year.split("-")[-1]):
+        for year in self._year_re.findall(question):
+            if int(year) > self._last_year:
                 warnings.append(f"Question mentions {year}, but our data is from {self.data_year}")
+                out_of_scope = True
         
-        # Look for "recent season" terms
-        recent_patterns = [r'202[3-9]', r'2024[/-]202[5-9]', r'current', r'\bnow\b', 
-                           r'\btoday\b', r'\blatest\b', r'\brecent\b', r'\bthis season\b']
-        for pattern in recent_patterns:
-            if re.search(pattern, question.lower()):
-                warnings.append(f"Question asks about current/recent data, but our dataset is from {self.data_year}")
-                break
+        # Look for "recent season" terms (a hint only, the data may still answer it)
+        if self._recent_re.search(question):
+            warnings.append(f"Question asks about current/recent data, but our dataset is from {self.data_year}")
         
-        # Players not in 2019-20 season (examples)
-        modern_players = ['haaland', 'nunez', 'antony', 'casemiro', 'tchouameni']
-        for player in modern_players:
-            if player in question.lower():
-                warnings.append(f"Question asks about {player.title()}, who likely wasn't in the {self.data_year} season")
+        # Players not in the dataset's season
+        words = set(self._word_re.findall(question.lower()))
+        for player in sorted(self._modern_players & words):
+            warnings.append(f"Question asks about {player.title()}, who likely wasn't in the {self.data_year} season")
+            out_of_scope = True
         
+        return tuple(warnings), out_of_scope
+    
+    def validate_question(self, question):
+        """Check if question might be outside our data scope"""
+        return list(self._check_scope_cached(question)[0])
+    
+    def is_out_of_scope(self, question):
+        """Check if question is clearly about seasons or players after our data"""
+        return self._check_scope_cached(question)[1]
+    
+    def _out_of_scope_answer(self):
+        """Templated reply used instead of retrieval + LLM for out-of-scope questions"""
+        self._last_k = 0
+        return f"I only have {self.data_year} data — no information about that."
+    
+    def _show_warnings(self, question, warnings=None):
+        """Print data scope warnings and return them (empty when validation is off)"""
+        if not self.show_validation:
+            return ()
+        if warnings is None:
+            warnings = self._check_scope_cached(question)[0]
+        if warnings:
+            print("\n DATA SCOPE WARNINGS:")
+            for warning in warnings:
+                print(f"   - {warning}")
+            print(f"    Our data covers: {self.data_year} FPL season only\n")
         return warnings
     
-    def ask_question(self, question):
-        """Ask a question and get an answer"""
-        if not self.qa_chain:
-            return "Please setup a document first!"
-        
-        # Show validation warnings
-        if self.show_validation:
-            warnings = self.validate_question(question)
-            if warnings:
-                print("\n DATA SCOPE WARNINGS:")
-                for warning in warnings:
-                    print(f"   - {warning}")
-                print(f"    Our data covers: {self.data_year} FPL season only\n")
-        
+    def _build_prompt(self, question):
+        """Retrieve relevant chunks and fill in the prompt"""
         if self.verbose:
             print(f"\n Question: {question}")
             print("Searching for relevant information...")
         
-        # Get answer
-        result = self.qa_chain.invoke({"query": question})
-        answer = result['result']
+        key = question.strip().lower()
+        texts = self._prefetch.get(key)
+        if texts is None:
+            query_vector = self._embed_query_cached(key)
+            texts = self.chunk_index.search(query_vector, self.config["retrieval_k"])
+        self._last_k = len(texts)
+        context = "\n\n".join(texts)
+        return self.prompt.format(context=context, question=question)
+    
+    def ask_question(self, question, warnings=None):
+        """Ask a question and get an answer (warnings can be passed if already validated)"""
+        if not self.prompt:
+            return "Please setup a document first!"
+        
+        # Show validation warnings
+        warnings = self._show_warnings(question, warnings)
+        
+        # Get answer, without retrieval or an LLM call when we can't have the data
+        if self.is_out_of_scope(question):
+            answer = self._out_of_scope_answer()
+        else:
+            message = self._build_prompt(question)
+            answer = self.llm.invoke(message).content
         
         print(f"Answer: {answer}")
         
         # Reminder if question is out of scope
-        if self.show_validation and self.validate_question(question):
+        if warnings:
             print(f"\nREMINDER: This answer is based on {self.data_year} data only!")
         
         if self.verbose:
-            print(f"\nBased on {len(result['source_documents'])} document chunks")
+            print(f"\nBased on {self._last_k} document chunks")
         
         return answer
-
+    
+    def stream_answer(self, question, warnings=None):
+        """Yield the answer piece by piece as the LLM generates it"""
+        if not self.prompt:
+            yield "Please setup a document first!"
+            return
+        
+        warnings = self._show_warnings(question, warnings)
+        
+        if self.is_out_of_scope(question):
+            yield self._out_of_scope_answer()
+        else:
+            message = self._build_prompt(question)
+            for chunk in self.llm.stream(message):
+                yield chunk.content
+        
+        if warnings:
+            print(f"\nREMINDER: This answer is based on {self.data_year} data only!")
+        
+        if self.verbose:
+            print(f"\nBased on {self._last_k} document chunks")
 
 def test_qa_system():
     """Test the complete Q&A system"""
@@ -27,3 +27,9 @@ try:
 except ImportError as e:
     print(f"failed:{e}")
 
+try:
+    import faiss
+    # faiss-cpu >= 1.8 wheels load the AVX2/AVX-512 build when the CPU supports it
+    print(f"FAISS import sucess (instruction sets: {', '.join(sorted(faiss.supported_instruction_sets()))})")
+except ImportError as e:
+    print(f"failed:{e}")